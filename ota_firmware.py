@@ -7,6 +7,7 @@
 # OTA Firmware Update Handler for MySensors
 
 import binascii
+import io
 import logging
 import os
 import struct
@@ -16,11 +17,20 @@ import crcmod
 FIRMWARE_BLOCK_SIZE = 16
 _LOGGER = logging.getLogger(__name__)
 
+# build the table-driven CRC function once; mkPredefinedCrcFun is expensive
+_CRC16_MODBUS = crcmod.predefined.mkPredefinedCrcFun('modbus')
+
+# crcmod normally runs its C extension; without it the pure-Python fallback is
+# orders of magnitude slower on multi-KB firmware images, so don't fail silently
+try:
+    import crcmod._crcfunext            # noqa: F401
+except ImportError:
+    _LOGGER.warning("crcmod C extension not available, firmware CRC will be slow")
+
 
 def compute_crc16(data):
     """Compute CRC16 MODBUS of data and return an int."""
-    crc16_func = crcmod.predefined.mkPredefinedCrcFun('modbus')
-    return crc16_func(data)
+    return _CRC16_MODBUS(data)
 
 
 def fw_hex_to_int(hex_str, words):
@@ -60,12 +70,18 @@ def load_firmware(path):
 def prepare_firmware(bin_string):
     """Check that firmware is valid and return dict with binary data."""
     pads = len(bin_string) % 128  # 128 bytes per page for atmega328
-    for _ in range(128 - pads):  # pad up to even 128 bytes
-        bin_string += b"\xff"
+    bin_string += b"\xff" * (128 - pads)  # pad up to even 128 bytes
     fware = {
         "blocks": int(len(bin_string) / FIRMWARE_BLOCK_SIZE),
         "crc": compute_crc16(bin_string),
-        "data": bin_string,
+        # readonly view: slicing it never copies (the view keeps the
+        # underlying bytes alive)
+        "data": memoryview(bin_string).toreadonly(),
+        # hex-encode each block once here, so block requests are a plain list lookup
+        "block_hex": [
+            binascii.hexlify(bin_string[i:i + FIRMWARE_BLOCK_SIZE]).decode("ascii")
+            for i in range(0, len(bin_string), FIRMWARE_BLOCK_SIZE)
+        ],
     }
     return fware
 
@@ -76,9 +92,8 @@ class OTAFirmwareManager:
     def __init__(self):
         """Initialize OTA Firmware Manager."""
         self.firmware_store = {}  # (fw_type, fw_ver) -> firmware dict
-        self.requested_nodes = {}  # node_id -> (fw_type, fw_ver)
-        self.unstarted_nodes = {}  # node_id -> (fw_type, fw_ver)
-        self.started_nodes = {}   # node_id -> (fw_type, fw_ver)
+        self.node_state = {}      # node_id -> (status, fw_type, fw_ver),
+                                  # status one of 'requested'/'unstarted'/'started'
         
     def load_firmware(self, fw_type, fw_ver, fw_path):
         """Load firmware from hex file.
@@ -100,13 +115,49 @@ class OTAFirmwareManager:
         fw_bin = load_firmware(fw_path)
         if not fw_bin:
             return False
-            
+
+        self._register_firmware(fw_type, fw_ver, fw_bin)
+        return True
+
+    def load_firmware_from_string(self, fw_type, fw_ver, hex_str):
+        """Load firmware from hex data already held in memory.
+
+        Args:
+            fw_type: Firmware type (int)
+            fw_ver: Firmware version (int)
+            hex_str: Contents of a .hex firmware file as a string
+
+        Returns:
+            bool: True if loaded successfully
+        """
+        try:
+            fw_type, fw_ver = int(fw_type), int(fw_ver)
+        except ValueError:
+            _LOGGER.error("Firmware type %s or version %s not valid, use integers", fw_type, fw_ver)
+            return False
+
+        try:
+            intel_hex = IntelHex()
+            intel_hex.fromfile(io.StringIO(hex_str), format="hex")
+            fw_bin = intel_hex.tobinstr()
+        except (IntelHexError, TypeError, ValueError) as exc:
+            _LOGGER.error("Firmware not valid, check the hex data: %s", exc)
+            return False
+
+        self._register_firmware(fw_type, fw_ver, fw_bin)
+        return True
+
+    def _register_firmware(self, fw_type, fw_ver, fw_bin):
+        """Prepare a binary image and store it with precomputed responses."""
         fware = prepare_firmware(fw_bin)
+        # the hex header and the whole config response are constant per
+        # firmware, so encode them once here instead of per node request
+        fware["hdr_hex"] = fw_int_to_hex(fw_type, fw_ver)
+        fware["config_hex"] = fw_int_to_hex(fw_type, fw_ver, fware["blocks"], fware["crc"])
         self.firmware_store[(fw_type, fw_ver)] = fware
-        _LOGGER.info("Loaded firmware type %s version %s: %d blocks, CRC %04X", 
+        _LOGGER.info("Loaded firmware type %s version %s: %d blocks, CRC %04X",
                     fw_type, fw_ver, fware["blocks"], fware["crc"])
-        return True
-    
+
     def delete_firmware(self, fw_type, fw_ver):
         """Delete firmware from memory.
         
@@ -145,12 +196,8 @@ class OTAFirmwareManager:
             _LOGGER.error("No firmware type %s version %s loaded", fw_type, fw_ver)
             return False
             
-        # Remove from other states
-        self.unstarted_nodes.pop(node_id, None)
-        self.started_nodes.pop(node_id, None)
-        
-        # Mark as requested
-        self.requested_nodes[node_id] = (fw_type, fw_ver)
+        # Mark as requested, replacing any previous state
+        self.node_state[node_id] = ('requested', fw_type, fw_ver)
         _LOGGER.info("Node %d requested for firmware update: type %s version %s", 
                     node_id, fw_type, fw_ver)
         return True
@@ -175,29 +222,27 @@ class OTAFirmwareManager:
                      node_id, req_fw_type, req_fw_ver, req_blocks, req_crc, bloader_ver)
         
         # Get firmware for this node
-        fw_id = (self.requested_nodes.get(node_id) or 
-                self.unstarted_nodes.get(node_id))
-        
-        if fw_id is None:
+        state = self.node_state.get(node_id)
+
+        if state is None or state[0] not in ('requested', 'unstarted'):
             _LOGGER.debug("Node %d not scheduled for firmware update", node_id)
             return None
-            
-        fw_type, fw_ver = fw_id
+
+        fw_type, fw_ver = state[1], state[2]
         fware = self.firmware_store.get((fw_type, fw_ver))
-        
+
         if fware is None:
             _LOGGER.error("No firmware type %s version %s found", fw_type, fw_ver)
             return None
-            
+
         # Move to unstarted if was in requested
-        self.requested_nodes.pop(node_id, None)
-        self.unstarted_nodes[node_id] = (fw_type, fw_ver)
+        self.node_state[node_id] = ('unstarted', fw_type, fw_ver)
         
         _LOGGER.info("Node %d updating from type %s ver %s to type %s ver %s",
                     node_id, req_fw_type, req_fw_ver, fw_type, fw_ver)
         
         # Response: fw_type, fw_ver, blocks, crc (ST_FIRMWARE_CONFIG_RESPONSE = 1)
-        return fw_int_to_hex(fw_type, fw_ver, fware["blocks"], fware["crc"])
+        return fware["config_hex"]
         
     def handle_firmware_request(self, node_id, payload):
         """Handle ST_FIRMWARE_REQUEST (type=2) from node.
@@ -219,32 +264,24 @@ class OTAFirmwareManager:
                      node_id, req_fw_type, req_fw_ver, req_block)
         
         # Get firmware for this node
-        fw_id = (self.unstarted_nodes.get(node_id) or 
-                self.started_nodes.get(node_id))
-        
-        if fw_id is None:
+        state = self.node_state.get(node_id)
+
+        if state is None or state[0] not in ('unstarted', 'started'):
             _LOGGER.debug("Node %d not in firmware update", node_id)
             return None
-            
+
         fw_type, fw_ver = req_fw_type, req_fw_ver  # Use requested version
         fware = self.firmware_store.get((fw_type, fw_ver))
-        
+
         if fware is None:
             _LOGGER.error("No firmware type %s version %s found", fw_type, fw_ver)
             return None
-            
+
         # Move to started
-        self.unstarted_nodes.pop(node_id, None)
-        self.started_nodes[node_id] = (fw_type, fw_ver)
-        
-        # Get block data
-        start = req_block * FIRMWARE_BLOCK_SIZE
-        end = start + FIRMWARE_BLOCK_SIZE
-        blk_data = fware["data"][start:end]
+        self.node_state[node_id] = ('started', fw_type, fw_ver)
         
         # Response: fw_type, fw_ver, block, data (ST_FIRMWARE_RESPONSE = 3)
-        payload = fw_int_to_hex(fw_type, fw_ver, req_block)
-        payload += binascii.hexlify(blk_data).decode("utf-8")
+        payload = fware["hdr_hex"] + fw_int_to_hex(req_block) + fware["block_hex"][req_block]
         
         _LOGGER.debug("Node %d sending block %d/%d", node_id, req_block, fware["blocks"]-1)
         return payload
@@ -258,7 +295,8 @@ class OTAFirmwareManager:
         Returns:
             bool: True if reboot required
         """
-        return node_id in self.requested_nodes
+        state = self.node_state.get(node_id)
+        return state is not None and state[0] == 'requested'
         
     def get_firmware_list(self):
         """Get list of all loaded firmware.
@@ -280,10 +318,5 @@ class OTAFirmwareManager:
         Returns:
             str: 'requested', 'unstarted', 'started', or None
         """
-        if node_id in self.requested_nodes:
-            return 'requested'
-        elif node_id in self.unstarted_nodes:
-            return 'unstarted'
-        elif node_id in self.started_nodes:
-            return 'started'
-        return None
+        state = self.node_state.get(node_id)
+        return state[0] if state is not None else None
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Sidecar daemon holding one persistent TCP connection to the MySensors Gateway
+
+Every invocation of test_reboot.py pays Python startup plus a TCP handshake
+to the gateway. This daemon connects to the gateway once, keeps the
+connection open, and accepts node IDs over a local UNIX domain socket, so a
+CLI invocation only pays a UDS round trip for the network part.
+
+Usage:
+  venv/bin/python reboot_daemon.py [--socket <path>]
+
+Protocol on the UNIX socket: one decimal node ID per line; the daemon
+answers "OK <nid>\n" or "ERR <nid>\n" per line.
+"""
+
+import argparse
+import os
+import socket
+import sys
+
+from test_reboot import (GATEWAY_HOST, GATEWAY_PORT, CONNECT_TIMEOUT,
+                         DAEMON_SOCKET, _resolve_gateway, build_message_bytes)
+
+
+class RebootDaemon:
+    """Forward reboot requests from a UNIX socket over one gateway connection"""
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.gateway = None
+
+    def _connect_gateway(self):
+        """(Re)open the persistent gateway connection, return it or None"""
+        if self.gateway is not None:
+            return self.gateway
+        try:
+            # resolve the gateway name once, reconnects reuse the sockaddr
+            family, kind, proto, _, addr = _resolve_gateway()
+            sock = socket.socket(family, kind, proto)
+            # frames are tiny and should not sit in Nagle's buffer
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(addr)
+            sock.settimeout(None)
+            self.gateway = sock
+            print(f"Connected to gateway {GATEWAY_HOST}:{GATEWAY_PORT}")
+        except OSError as e:
+            print(f"✗ Gateway connection failed: {e}")
+        return self.gateway
+
+    def _drop_gateway(self):
+        """Close the gateway connection so the next request reconnects"""
+        if self.gateway is not None:
+            self.gateway.close()
+            self.gateway = None
+
+    def _forward(self, node_id):
+        """Send one reboot frame to the gateway, with one reconnect attempt
+
+        Args:
+            node_id: node to reboot
+
+        Returns:
+            bool: True if the frame was written to the gateway connection
+        """
+        frame = build_message_bytes(node_id)
+        for _ in range(2):
+            sock = self._connect_gateway()
+            if sock is None:
+                return False
+            try:
+                sock.sendall(frame)
+                return True
+            except OSError:
+                # stale connection (gateway restarted); reconnect once
+                self._drop_gateway()
+        return False
+
+    def _handle_client(self, conn):
+        """Serve one CLI connection: a line of node ID per reboot request"""
+        with conn, conn.makefile('rb') as reader:
+            for line in reader:
+                try:
+                    node_id = int(line)
+                except ValueError:
+                    conn.sendall(b"ERR %s\n" % line.strip())
+                    continue
+                ok = self._forward(node_id)
+                print(f"{'✓' if ok else '✗'} Reboot node {node_id}")
+                conn.sendall(b"%s %d\n" % (b"OK" if ok else b"ERR", node_id))
+
+    def run(self):
+        """Accept CLI connections on the UNIX socket until interrupted"""
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(5)
+        print(f"Listening on {self.socket_path}")
+        try:
+            while True:
+                conn, _ = server.accept()
+                self._handle_client(conn)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            self._drop_gateway()
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Hold a persistent gateway connection for reboot commands")
+    parser.add_argument('--socket', default=DAEMON_SOCKET, metavar='PATH',
+                        help=f"UNIX socket to listen on (default: {DAEMON_SOCKET})")
+    args = parser.parse_args()
+    RebootDaemon(args.socket).run()
+    sys.exit(0)
@@ -6,117 +6,295 @@ Usage:
   venv/bin/python test_reboot.py --test              # Test message format only
   venv/bin/python test_reboot.py --send <nid> [...]  # Send reboot to one or more nodes
 
+Options for --send:
+  --pace-ms <ms>    delay between frames, for radio networks that need it
+
 """
 
+import argparse
+import functools
+import os
 import sys
 import socket
 import time
-import mysensors
 
 GATEWAY_HOST = "192.168.2.211"
 GATEWAY_PORT = 5003
 
+# the gateway is on the LAN, so a live one answers the handshake within one
+# RTT; keep the connect timeout short so a down gateway fails fast instead
+# of blocking for seconds
+CONNECT_TIMEOUT = 0.2
+
+# UNIX socket of reboot_daemon.py; when the daemon is running, --send goes
+# through its persistent gateway connection instead of a fresh TCP handshake
+DAEMON_SOCKET = "/run/mysensors-reboot.sock"
+
+# MySensors protocol constants; inlined so this CLI does not pay the app's
+# mysensors import on every invocation
+C_INTERNAL = 3   # mysensors.Commands.C_INTERNAL
+I_REBOOT = 13    # mysensors.Internal.I_REBOOT
+_SUFFIX = f";255;{C_INTERNAL};0;{I_REBOOT};"
+_SUFFIX_BYTES = (_SUFFIX + "\n").encode('ascii')
+
+def build_message(node_id):
+    """Build the reboot message for one node (without trailing newline)"""
+    return f"{node_id}{_SUFFIX}"
+
+# there are only 255 possible node IDs, so each frame is built at most once
+@functools.lru_cache(maxsize=256)
+def build_message_bytes(node_id):
+    """Build the wire frame for one node as bytes, newline included"""
+    return b"%d%s" % (node_id, _SUFFIX_BYTES)
+
+# one write per node instead of seven line-buffered prints
+_TEST_TEMPLATE = (
+    "Reboot message for node {n}:\n"
+    "  Message: {m}\n"
+    f"  C_INTERNAL value: {C_INTERNAL}\n"
+    f"  I_REBOOT value: {I_REBOOT}\n"
+    "\n"
+    "Expected format: node_id;255;3;0;13;\n"
+    "Actual format:   {m}\n"
+)
+
 def test_reboot_message(node_id):
     """Generate and print reboot message"""
-    ack = 0
-    message = f"{node_id};255;{mysensors.Commands.C_INTERNAL};{ack};{mysensors.Internal.I_REBOOT};"
-    print(f"Reboot message for node {node_id}:")
-    print(f"  Message: {message}")
-    print(f"  C_INTERNAL value: {mysensors.Commands.C_INTERNAL}")
-    print(f"  I_REBOOT value: {mysensors.Internal.I_REBOOT}")
-    print()
-    print("Expected format: node_id;255;3;0;13;")
-    print(f"Actual format:   {message}")
-    print()
+    message = build_message(node_id)
+    print(_TEST_TEMPLATE.format(n=node_id, m=message))
     return message
 
-def send_reboot_to_gateway(node_id):
-    """Actually send reboot command to MySensors Gateway"""
-    ack = 0
-    message = f"{node_id};255;{mysensors.Commands.C_INTERNAL};{ack};{mysensors.Internal.I_REBOOT};"
-    
-    print(f"Sending reboot command to node {node_id}...")
-    print(f"Gateway: {GATEWAY_HOST}:{GATEWAY_PORT}")
-    print(f"Message: {message}")
-    
+_gateway_addrinfo = None
+
+def _resolve_gateway():
+    """Resolve the gateway address once and reuse it for reconnects"""
+    global _gateway_addrinfo
+    if _gateway_addrinfo is None:
+        _gateway_addrinfo = socket.getaddrinfo(
+            GATEWAY_HOST, GATEWAY_PORT, socket.AF_INET, socket.SOCK_STREAM)[0]
+    return _gateway_addrinfo
+
+def _connect_to_gateway(log):
+    """Open a connection to the gateway, logging the reason on failure
+
+    Args:
+        log: list collecting output lines for the batch
+
+    Returns:
+        socket or None
+    """
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(5.0)
-        sock.connect((GATEWAY_HOST, GATEWAY_PORT))
-        
-        # Send message with newline as per MySensors protocol
-        sock.sendall((message + "\n").encode('utf-8'))
-        print(f"✓ Successfully sent reboot command to node {node_id}")
-        
-        sock.close()
-        return True
-        
+        family, kind, proto, _, addr = _resolve_gateway()
+        sock = socket.socket(family, kind, proto)
+        # disable Nagle: the frames are ~20 bytes and should go out
+        # immediately instead of waiting for coalescing/delayed ACKs
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(addr)
+        # connected: go back to blocking mode for the sends
+        sock.settimeout(None)
+        return sock
     except socket.timeout:
-        print(f"✗ Error: Connection timeout to {GATEWAY_HOST}:{GATEWAY_PORT}")
-        return False
+        log.append(f"✗ Error: Connection timeout to {GATEWAY_HOST}:{GATEWAY_PORT}")
     except ConnectionRefusedError:
-        print(f"✗ Error: Connection refused to {GATEWAY_HOST}:{GATEWAY_PORT}")
-        print("  Is the gateway running?")
-        return False
+        log.append(f"✗ Error: Connection refused to {GATEWAY_HOST}:{GATEWAY_PORT}")
+        log.append("  Is the gateway running?")
     except Exception as e:
-        print(f"✗ Error: {e}")
-        return False
+        log.append(f"✗ Error: {e}")
+    return None
+
+def _send_frame(sock, frame):
+    """Write one frame to the (blocking) socket via its raw fd
+
+    os.write is a thinner wrapper around write(2) than the socket object's
+    sendall; for these ~15-byte frames the Python-level overhead is the
+    bigger share of the cost.
+    """
+    fd = sock.fileno()
+    view = memoryview(frame)
+    sent = 0
+    while sent < len(view):
+        sent += os.write(fd, view[sent:])
+
+def send_reboot_batch(node_ids, pace_ms=0):
+    """Send reboot commands to one or more nodes over a single connection
+
+    One TCP handshake for the whole batch instead of one per node, and no
+    artificial delay between messages (pass pace_ms if the radio network
+    downstream of the gateway needs the frames spaced out). If the
+    connection drops mid-batch, one reconnect is attempted so the
+    remaining nodes are not lost.
+
+    Args:
+        node_ids: iterable of node IDs to reboot
+        pace_ms: optional delay between frames in milliseconds
+
+    Returns:
+        list: (node_id, success) tuples
+    """
+    # collect output and write it once at the end: one write() syscall for
+    # the whole batch instead of one per line on a line-buffered TTY
+    log = [f"Gateway: {GATEWAY_HOST}:{GATEWAY_PORT}"]
+    try:
+        sock = _connect_to_gateway(log)
+        if sock is None:
+            return [(node_id, False) for node_id in node_ids]
+
+        # wire frames are pre-encoded bytes, newline included
+        frames = [build_message_bytes(node_id) for node_id in node_ids]
+
+        results = []
+        try:
+            if not pace_ms:
+                try:
+                    # one vectored write for the whole batch, the kernel coalesces
+                    # the frames into as few TCP segments as possible
+                    sent = sock.sendmsg(frames)
+                    total = sum(len(f) for f in frames)
+                    if sent < total:
+                        sock.sendall(b"".join(frames)[sent:])
+                    for node_id, frame in zip(node_ids, frames):
+                        log.append(f"✓ Sent reboot command to node {node_id}: {frame[:-1].decode('ascii')}")
+                    return [(node_id, True) for node_id in node_ids]
+                except OSError as e:
+                    # fall back to frame-by-frame so failing nodes can be identified
+                    log.append(f"✗ Batch send failed ({e}), retrying frame by frame")
+                    sock.close()
+                    sock = _connect_to_gateway(log)
+                    if sock is None:
+                        return [(node_id, False) for node_id in node_ids]
+
+            for i, node_id in enumerate(node_ids):
+                if pace_ms and i:
+                    time.sleep(pace_ms / 1000)
+                frame = frames[i]
+                log.append(f"Message: {frame[:-1].decode('ascii')}")
+                try:
+                    _send_frame(sock, frame)
+                    log.append(f"✓ Successfully sent reboot command to node {node_id}")
+                    results.append((node_id, True))
+                except OSError as e:
+                    log.append(f"✗ Error sending to node {node_id}: {e}")
+                    results.append((node_id, False))
+                    # a dropped link should not fail every remaining node
+                    sock.close()
+                    sock = _connect_to_gateway(log)
+                    if sock is None:
+                        results.extend((n, False) for n in node_ids[i+1:])
+                        return results
+        finally:
+            if sock is not None:
+                try:
+                    # announce end-of-data so the FIN goes out with the last frame
+                    sock.shutdown(socket.SHUT_WR)
+                except OSError:
+                    pass
+                sock.close()
+        return results
+    finally:
+        sys.stdout.write("\n".join(log) + "\n")
+
+def send_reboot_via_daemon(node_ids):
+    """Send reboot commands through a running reboot_daemon.py
+
+    The daemon holds one persistent connection to the gateway, so this path
+    only costs a UNIX-socket round trip per invocation.
+
+    Args:
+        node_ids: iterable of node IDs to reboot
+
+    Returns:
+        list: (node_id, success) tuples, or None if no daemon is reachable
+    """
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(DAEMON_SOCKET)
+    except OSError:
+        return None
+
+    results = []
+    try:
+        sock.settimeout(5.0)
+        sock.sendall(b"".join(b"%d\n" % node_id for node_id in node_ids))
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile('rb') as reader:
+            replies = {}
+            for line in reader:
+                status, _, node_id = line.partition(b" ")
+                replies[int(node_id)] = status == b"OK"
+        results = [(node_id, replies.get(node_id, False)) for node_id in node_ids]
+    except (OSError, ValueError) as e:
+        print(f"✗ Error talking to reboot daemon: {e}")
+        results = [(node_id, False) for node_id in node_ids]
+    finally:
+        sock.close()
+    return results
+
+def send_reboot_to_gateway(node_id):
+    """Actually send reboot command to MySensors Gateway"""
+    print(f"Sending reboot command to node {node_id}...")
+    return send_reboot_batch([node_id])[0][1]
+
+def _node_id(value):
+    """argparse type for a MySensors node ID (0..254)"""
+    node_id = int(value)
+    if node_id < 0 or node_id > 254:
+        raise argparse.ArgumentTypeError(f"Node ID {node_id} must be between 0 and 254")
+    return node_id
+
+def _pace_ms(value):
+    """argparse type for a non-negative frame delay in milliseconds"""
+    pace_ms = int(value)
+    if pace_ms < 0:
+        raise argparse.ArgumentTypeError(f"Pace {pace_ms} must not be negative")
+    return pace_ms
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print(__doc__)
-        sys.exit(1)
-    
-    if sys.argv[1] == '--test':
+    parser = argparse.ArgumentParser(
+        description="Send reboot commands to MySensors nodes via the gateway")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--test', action='store_true',
+                       help="test message format only, nothing is sent")
+    group.add_argument('--send', nargs='+', type=_node_id, metavar='NODE_ID',
+                       help="send reboot to one or more nodes")
+    parser.add_argument('--pace-ms', type=_pace_ms, default=0, metavar='MS',
+                        help="delay between frames in milliseconds (default: 0)")
+    args = parser.parse_args()
+
+    if args.test:
         # Test message format only
         print("Testing message format for various node IDs:\n")
         for nid in [7, 44, 103, 108, 121]:
             msg = test_reboot_message(nid)
             print(f"Match: {msg == f'{nid};255;3;0;13;'}")
             print("-" * 60)
-    
-    elif sys.argv[1] == '--send':
+
+    else:
         # Send actual reboot command to one or more nodes
-        if len(sys.argv) < 3:
-            print("Usage: test_reboot.py --send <node_id> [node_id2] [node_id3] ...")
-            sys.exit(1)
-        
-        node_ids = []
-        for arg in sys.argv[2:]:
-            try:
-                node_id = int(arg)
-                if node_id < 0 or node_id > 254:
-                    print(f"Error: Node ID {node_id} must be between 0 and 254")
-                    sys.exit(1)
-                node_ids.append(node_id)
-            except ValueError:
-                print(f"Error: '{arg}' is not a valid node ID")
-                sys.exit(1)
-        
+        node_ids = args.send
         print(f"Sending reboot commands to {len(node_ids)} node(s): {', '.join(map(str, node_ids))}\n")
-        
-        results = []
-        for i, node_id in enumerate(node_ids):
-            if i > 0:
-                print()  # Add blank line between nodes
-                time.sleep(0.5)  # Small delay between commands
-            
-            success = send_reboot_to_gateway(node_id)
-            results.append((node_id, success))
-        
-        # Summary
+
+        # prefer a running reboot daemon (persistent gateway connection),
+        # otherwise open our own connection for the batch
+        results = None
+        if not args.pace_ms:
+            results = send_reboot_via_daemon(node_ids)
+        if results is None:
+            results = send_reboot_batch(node_ids, pace_ms=args.pace_ms)
+
+        # Summary: split results into the two outcome lists in one pass,
+        # the counters are then just len() calls
+        successes, failures = [], []
+        for node_id, success in results:
+            (successes if success else failures).append(node_id)
+
         print("\n" + "=" * 60)
         print("Summary:")
-        successful = sum(1 for _, success in results if success)
-        failed = len(results) - successful
-        
-        for node_id, success in results:
-            status = "✓" if success else "✗"
-            print(f"  {status} Node {node_id}")
-        
-        print(f"\nTotal: {successful} successful, {failed} failed")
-        sys.exit(0 if failed == 0 else 1)
-    
-    else:
-        print(__doc__)
-        sys.exit(1)
+        for node_id in successes:
+            print(f"  ✓ Node {node_id}")
+        for node_id in failures:
+            print(f"  ✗ Node {node_id}")
+
+        print(f"\nTotal: {len(successes)} successful, {len(failures)} failed")
+        sys.exit(0 if not failures else 1)